@@ -4,6 +4,7 @@ Main entry point for the Water Pump Automation Streamlit application.
 """
 import sys
 import os
+import logging
 
 # Add the src directory to the Python path
 # This allows importing modules from src/ like 'from src.gui import main_gui'
@@ -16,18 +17,24 @@ if src_path not in sys.path:
 # Now import from src
 try:
     from gui import main_gui
-    from database import create_tables
+    from config import LOG_LEVEL
 except ImportError as e:
      print(f"Error importing modules. Ensure '{src_path}' is accessible.")
      print(f"Original Error: {e}")
      sys.exit(1)
 
 
+def configure_logging() -> None:
+    """Configures the root logger once for the whole application (Streamlit reruns this script)."""
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
 if __name__ == "__main__":
+    configure_logging()
     print("Starting Water Pump Automation System...")
-    # Ensure database tables are ready before starting the GUI
-    print("Initializing database...")
-    create_tables()
+    # Database tables are created once per process when the GUI first sets up the shared controller
     print("Launching Streamlit GUI...")
     # The Streamlit app is defined and run within gui.main_gui()
     # Streamlit handles the server and execution flow.
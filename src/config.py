@@ -9,9 +9,6 @@ from datetime import time
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 DATABASE_PATH = os.path.join(DATA_DIR, 'automation_logs.db')
 
-# Ensure data directory exists
-os.makedirs(DATA_DIR, exist_ok=True)
-
 # --- Tank Capacities (in Liters, example values) ---
 MAIN_LINE_TANK_CAPACITY = 1000
 UNDERGROUND_TANK_CAPACITY = 5000
@@ -41,6 +38,17 @@ P3_WARN_THRESHOLD_UNDERGROUND_LOW = 5.0  # Warning if Underground < 5%
 P3_WARN_THRESHOLD_UNDERGROUND_HIGH = 10.0 # Warning if Underground between 5% and 10%
 P3_STOP_THRESHOLD_UNDERGROUND = 5.0    # Stop P3 if Underground < 5%
 
+# Hysteresis: stop thresholds sit this far above the matching start thresholds
+P3_STOP_HYSTERESIS = 10.0              # Stop P3 once Overhead >= P3_START_THRESHOLD_OVERHEAD + this
+P1_STOP_HYSTERESIS = 10.0              # Stop P1 once Underground >= P3_SIGNAL_TARGET_UNDERGROUND + this
+MIN_PUMP_DWELL_SECONDS = 10            # Minimum time a pump holds a state before the automation changes it
+
+# --- Automatic Rule Evaluation ---
+# Rules are precomputed into a lookup table over level bins of this width.
+# Every threshold above must be a multiple of it for the table to be exact.
+DECISION_TABLE_BIN_PCT = 5.0
+DEBUG_RULES = False # Evaluate the rules directly instead of using the lookup table
+
 # --- Pump Flow Rates (Liters per second, for simulation) ---
 P1_FLOW_RATE = 10.0
 P2_FLOW_RATE = 8.0
@@ -57,7 +65,7 @@ PEAK_HOUR_START = time(18, 30) # 6:30 PM
 PEAK_HOUR_END = time(22, 30)   # 10:30 PM
 
 # --- Electricity Meter Schedule ---
-GROUND_FLOOR_METER_DAYS = range(1, 16) # 1st to 15th
+GROUND_FLOOR_METER_CUTOFF = 16 # Ground floor meter for days before this (1st to 15th), First Floor after
 
 # --- Simulation Settings ---
 SIMULATION_INTERVAL_SECONDS = 1 # How often the simulation state updates in real-time seconds
@@ -65,9 +73,9 @@ STATE_UPDATE_INTERVAL = 1 # How often the Streamlit app refreshes in seconds
 
 # --- Logging ---
 LOG_LEVEL = "INFO"
+LOG_FLUSH_INTERVAL_SECONDS = 2 # How often queued log rows are written to the database
+LOG_REPEAT_FLUSH_COUNT = 60 # Identical consecutive pump log entries are collapsed into one INFO row per this many repeats
 
 # --- GUI ---
 APP_TITLE = "Water Pump Automation System"
 
-print(f"Database will be stored at: {DATABASE_PATH}")
-
@@ -4,64 +4,295 @@ Core logic engine for the Water Pump Automation System.
 Evaluates rules, controls pumps, and logs actions.
 """
 import datetime
-from typing import Dict, Optional
+import functools
+import math
+import threading
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
 
 from config import (
-    PEAK_HOUR_START, PEAK_HOUR_END, GROUND_FLOOR_METER_DAYS,
+    PEAK_HOUR_START, PEAK_HOUR_END, GROUND_FLOOR_METER_CUTOFF,
     P1_START_THRESHOLD_UNDERGROUND, P1_STOP_THRESHOLD_MAIN_LINE, P1_REQ_MAIN_LINE_LEVEL,
     P1_MANUAL_BYPASS_MIN_UNDERGROUND, P1_MANUAL_BYPASS_MIN_MAIN_LINE,
     P2_START_THRESHOLD_MAIN_LINE, P2_START_THRESHOLD_UNDERGROUND, P2_START_THRESHOLD_OVERHEAD,
     P2_STOP_THRESHOLD_UNDERGROUND,
     P3_START_THRESHOLD_OVERHEAD, P3_REQ_UNDERGROUND_LEVEL, P3_SIGNAL_PUMP_THRESHOLD_UNDERGROUND,
     P3_SIGNAL_TARGET_UNDERGROUND, P3_WARN_THRESHOLD_OVERHEAD, P3_WARN_THRESHOLD_UNDERGROUND_LOW,
-    P3_WARN_THRESHOLD_UNDERGROUND_HIGH, P3_STOP_THRESHOLD_UNDERGROUND
+    P3_WARN_THRESHOLD_UNDERGROUND_HIGH, P3_STOP_THRESHOLD_UNDERGROUND,
+    P3_STOP_HYSTERESIS, P1_STOP_HYSTERESIS,
+    DECISION_TABLE_BIN_PCT, DEBUG_RULES, LOG_REPEAT_FLUSH_COUNT
 )
-from pumps import Pump, PumpState
+from pumps import ON_STATES, Pump, PumpIdx, PumpState
 from sensors import get_current_water_levels, check_pump_pressure, update_tank_levels
 from database import log_pump_action
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+_NOT_AUTOMATIC_STATES = frozenset({PumpState.ERROR, PumpState.MANUAL_ON}) # Automatic logic leaves these pumps alone
+
+# Time constraints as plain integers so the per-cycle check is a few int compares
+_PEAK_START_SEC = PEAK_HOUR_START.hour * 3600 + PEAK_HOUR_START.minute * 60 + PEAK_HOUR_START.second
+_PEAK_END_SEC = PEAK_HOUR_END.hour * 3600 + PEAK_HOUR_END.minute * 60 + PEAK_HOUR_END.second
+
+# --- System Messages ---
+# The controller stores a message code plus format args; the text is only built when read.
+_PEAK_RANGE_STR = f"{PEAK_HOUR_START:%H:%M} - {PEAK_HOUR_END:%H:%M}"
+
+_MSG_PEAK_HOURS = 0
+_MSG_ACTIVE_METER = 1
+_MSG_P3_STOPPED = 2
+_MSG_P3_BLOCKED = 3
+_MSG_P1_BLOCKED = 4
+
+_MESSAGES: Tuple[str, ...] = (
+    f"Peak hours active ({_PEAK_RANGE_STR}). Automatic pumping paused.",
+    "Active Meter: {meter}",
+    "P3 stopped. Underground low ({ug:.1f}%). Requesting fill.",
+    f"P3 needs to start (Overhead < {P3_START_THRESHOLD_OVERHEAD}%) but Underground level ({{ug:.1f}}%) is below required {P3_REQ_UNDERGROUND_LEVEL}%.",
+    f"P1 cannot start: Underground needs fill ({{ug:.1f}}%) but Main Line level ({{ml:.1f}}%) is below required {P1_REQ_MAIN_LINE_LEVEL}%.",
+)
+
+# --- Automatic Rule Decisions ---
+# Rule ids stored in the decision table; each maps to (action, reason, system message code).
+# Reason and message templates are formatted with the levels ml/ug/oh when the rule fires.
+_RULE_NONE = 0
+_RULE_P3_STOP_OVERHEAD_FULL = 1
+_RULE_P3_STOP_UNDERGROUND_LOW = 2
+_RULE_P3_START = 3
+_RULE_P3_BLOCKED = 4
+_RULE_P1_STOP_MAIN_LINE_LOW = 5
+_RULE_P1_STOP_UNDERGROUND_FULL = 6
+_RULE_P1_START = 7
+_RULE_P1_BLOCKED = 8
+_RULE_P2_STOP = 9
+_RULE_P2_START_CRITICAL = 10
+_RULE_P2_START_BACKUP = 11
+
+_RULES: Tuple[Tuple[Optional[str], Optional[str], Optional[int]], ...] = (
+    (None, None, None),
+    ("STOP", "Overhead Tank reached {oh:.1f}%", None),
+    ("STOP", f"Underground Tank fell below {P3_STOP_THRESHOLD_UNDERGROUND}%", _MSG_P3_STOPPED),
+    ("START", f"Overhead Tank < {P3_START_THRESHOLD_OVERHEAD}%", None),
+    (None, None, _MSG_P3_BLOCKED),
+    ("STOP", f"Main Line Tank < {P1_STOP_THRESHOLD_MAIN_LINE}%", None),
+    ("STOP", "Underground Tank reached target level ({ug:.1f}%)", None),
+    ("START", f"Underground Tank < {max(P1_START_THRESHOLD_UNDERGROUND, P3_REQ_UNDERGROUND_LEVEL)}%", None),
+    (None, None, _MSG_P1_BLOCKED),
+    ("STOP", f"Underground Tank reached {P2_STOP_THRESHOLD_UNDERGROUND}%", None),
+    ("START", "Critical low levels detected in all tanks", None),
+    ("START", "Backup needed: P3 requires water and P1 cannot run (Main Line {ml:.1f}%)", None),
+)
+
+# Dry-run protection: these stops apply immediately, without waiting out the minimum dwell time
+_UNDEBOUNCED_RULES = frozenset({_RULE_P3_STOP_UNDERGROUND_LOW, _RULE_P1_STOP_MAIN_LINE_LOW})
+
+_PUMP_ORDER = tuple(idx.name for idx in PumpIdx) # Pump axis of the decision table
+
+def _evaluate_rule(pump_id: str, is_on: bool, ml_level: float, ug_level: float, oh_level: float) -> int:
+    """Evaluates the automatic pump rules for one pump and returns the matching rule id."""
+    if pump_id == "P3":
+        if is_on:
+            # Conditions to STOP P3
+            if oh_level >= P3_START_THRESHOLD_OVERHEAD + P3_STOP_HYSTERESIS: # Stop with a buffer
+                return _RULE_P3_STOP_OVERHEAD_FULL
+            if ug_level < P3_STOP_THRESHOLD_UNDERGROUND:
+                return _RULE_P3_STOP_UNDERGROUND_LOW # Signal P1/P2 logic to fill
+        elif oh_level < P3_START_THRESHOLD_OVERHEAD:
+            # Conditions to START P3; if UG is too low, P1/P2 pick up the implicit signal
+            return _RULE_P3_START if ug_level >= P3_REQ_UNDERGROUND_LEVEL else _RULE_P3_BLOCKED
+
+    elif pump_id == "P1":
+        if is_on:
+            # Conditions to STOP P1
+            if ml_level < P1_STOP_THRESHOLD_MAIN_LINE:
+                return _RULE_P1_STOP_MAIN_LINE_LOW
+            if ug_level >= P3_SIGNAL_TARGET_UNDERGROUND + P1_STOP_HYSTERESIS: # Stop if UG tank is sufficiently full (e.g. filled after P3 request)
+                return _RULE_P1_STOP_UNDERGROUND_FULL
+        else:
+            # Start if UG is low OR if P3 signaled for more water (UG < P3_REQ_UNDERGROUND_LEVEL)
+            needs_fill = ug_level < P1_START_THRESHOLD_UNDERGROUND or ug_level < P3_REQ_UNDERGROUND_LEVEL
+            if needs_fill:
+                return _RULE_P1_START if ml_level >= P1_REQ_MAIN_LINE_LEVEL else _RULE_P1_BLOCKED
+
+    elif pump_id == "P2":
+        if is_on:
+            # Conditions to STOP P2
+            if ug_level >= P2_STOP_THRESHOLD_UNDERGROUND:
+                return _RULE_P2_STOP
+        else:
+            # Start if Main Line is very low AND Underground is very low AND Overhead is very low
+            # OR if P3 signaled and P1 cannot run
+            critical_levels = (ml_level < P2_START_THRESHOLD_MAIN_LINE and
+                               ug_level < P2_START_THRESHOLD_UNDERGROUND and
+                               oh_level < P2_START_THRESHOLD_OVERHEAD)
+            p3_needs_water_p1_cant = (ug_level < P3_REQ_UNDERGROUND_LEVEL and
+                                      ml_level < P1_REQ_MAIN_LINE_LEVEL) # P1 can't fulfill P3's need
+            if critical_levels:
+                return _RULE_P2_START_CRITICAL
+            if p3_needs_water_p1_cant:
+                return _RULE_P2_START_BACKUP
+
+    return _RULE_NONE
+
+# Every level boundary _evaluate_rule compares against; the decision table is only exact if each is bin-aligned
+_RULE_THRESHOLDS: Tuple[float, ...] = (
+    P3_START_THRESHOLD_OVERHEAD + P3_STOP_HYSTERESIS, P3_STOP_THRESHOLD_UNDERGROUND,
+    P3_START_THRESHOLD_OVERHEAD, P3_REQ_UNDERGROUND_LEVEL,
+    P1_STOP_THRESHOLD_MAIN_LINE, P3_SIGNAL_TARGET_UNDERGROUND + P1_STOP_HYSTERESIS,
+    P1_START_THRESHOLD_UNDERGROUND, P1_REQ_MAIN_LINE_LEVEL,
+    P2_STOP_THRESHOLD_UNDERGROUND, P2_START_THRESHOLD_MAIN_LINE,
+    P2_START_THRESHOLD_UNDERGROUND, P2_START_THRESHOLD_OVERHEAD,
+)
+
+def _misaligned_thresholds() -> Tuple[float, ...]:
+    """Returns the rule thresholds that are not a multiple of DECISION_TABLE_BIN_PCT."""
+    return tuple(t for t in _RULE_THRESHOLDS
+                 if not math.isclose(t / DECISION_TABLE_BIN_PCT, round(t / DECISION_TABLE_BIN_PCT), abs_tol=1e-9))
+
+@functools.lru_cache(maxsize=None)
+def _build_decision_table() -> Optional[np.ndarray]:
+    """
+    Precomputes the rule id for every (main line, underground, overhead) level bin,
+    pump and on/off state. All thresholds are multiples of DECISION_TABLE_BIN_PCT,
+    so evaluating the rules at each bin's lower edge is exact for the whole bin.
+    Returns None if a threshold is not bin-aligned; the rules are then evaluated directly.
+    """
+    misaligned = _misaligned_thresholds()
+    if misaligned:
+        logger.warning("Rule thresholds %s are not multiples of DECISION_TABLE_BIN_PCT=%s; "
+                       "evaluating rules directly instead of using the decision table.", misaligned, DECISION_TABLE_BIN_PCT)
+        return None
+    n_bins = int(100.0 / DECISION_TABLE_BIN_PCT) + 1
+    table = np.empty((n_bins, n_bins, n_bins, len(_PUMP_ORDER), 2), dtype=np.int8)
+    for ml_bin in range(n_bins):
+        for ug_bin in range(n_bins):
+            for oh_bin in range(n_bins):
+                levels = (ml_bin * DECISION_TABLE_BIN_PCT, ug_bin * DECISION_TABLE_BIN_PCT, oh_bin * DECISION_TABLE_BIN_PCT)
+                for pump_idx, pump_id in enumerate(_PUMP_ORDER):
+                    for on in (0, 1): # Plain ints: a bool index would act as a numpy mask
+                        table[ml_bin, ug_bin, oh_bin, pump_idx, on] = _evaluate_rule(pump_id, bool(on), *levels)
+    table.setflags(write=False)
+    return table
 
 class AutomationController:
     """Manages the overall state and control logic of the pump system."""
 
     def __init__(self):
-        self.pumps: Dict[str, Pump] = {
-            "P1": Pump("P1"),
-            "P2": Pump("P2"),
-            "P3": Pump("P3"),
-        }
+        # Pump states live in one array indexed by PumpIdx; each Pump is a view onto its slot
+        self._state: np.ndarray = np.full(len(PumpIdx), PumpState.OFF, dtype=np.int8)
+        self.pumps: Dict[str, Pump] = {idx.name: Pump(idx.name, self._state, idx) for idx in PumpIdx}
+        self.pump_items: Tuple[Tuple[str, Pump], ...] = tuple(self.pumps.items()) # Fixed (pump_id, pump) order for iteration
         self.last_levels: Dict[str, float] = {}
         self.active_meter: str = "Ground" # Default, will be updated
         self.is_peak_hours: bool = False
         self.warnings: list[str] = [] # Store warnings for UI display
-        self.system_message: Optional[str] = None # General status messages
+        self._message: Optional[Tuple[int, Dict[str, object]]] = None # General status message as (code, format args)
         self.manual_override: Dict[str, bool] = {"P1": False, "P2": False} # Track manual requests
-        logging.info("Automation Controller initialized.")
+        self._pressures: Dict[str, bool] = {} # Pressure readings taken so far in the current cycle
+        self._decision_table: Optional[np.ndarray] = _build_decision_table() # None when the table wouldn't be exact
+        self.lock = threading.RLock() # Held while a cycle runs; the control loop runs in its own thread
+        self._now: datetime.datetime = datetime.datetime.now() # Time of the current/most recent cycle
+        self._last_log_key: Dict[str, Tuple[str, str]] = {} # Last (action, reason) logged per pump
+        self._repeat_counts: Dict[str, int] = {} # Suppressed repeats of _last_log_key per pump
+        self._constraints_minute: Optional[datetime.datetime] = None # Minute last checked by check_time_constraints_if_needed
+        logger.info("Automation Controller initialized.")
+
+    @property
+    def system_message(self) -> Optional[str]:
+        """General status message, formatted only when read."""
+        message = self._message
+        if message is None:
+            return None
+        code, args = message
+        return _MESSAGES[code].format(**args)
 
     def get_pump_states(self) -> Dict[str, bool]:
         """Returns a simple dictionary of which pumps are currently ON."""
-        return {pid: p.is_on() for pid, p in self.pumps.items()}
+        return {pump_id: state in ON_STATES for pump_id, state in zip(_PUMP_ORDER, self._state.tolist())}
+
+    def _on_mask(self) -> int:
+        """Running pumps as a bitmask (bit PumpIdx.Px set when Px runs), for the tank simulation."""
+        mask = 0
+        for idx, state in enumerate(self._state.tolist()):
+            if state in ON_STATES:
+                mask |= 1 << idx
+        return mask
+
+    def _set_pump_state(self, pump_id: str, new_state: PumpState, reason: str = "") -> None:
+        """Sets a pump's state, stamped with the current cycle time."""
+        self.pumps[pump_id].set_state(new_state, reason=reason, changed_at=self._now)
+
+    def _pressure_ok(self, pump_id: str) -> bool:
+        """Returns the pump's pressure reading for this cycle, taking it only when first needed."""
+        ok = self._pressures.get(pump_id)
+        if ok is None:
+            ok = self._pressures[pump_id] = check_pump_pressure(pump_id)
+        return ok
 
     def _check_time_constraints(self, current_time: datetime.datetime) -> None:
         """Updates active meter and peak hour status."""
         # Check peak hours
-        now_time = current_time.time()
-        self.is_peak_hours = PEAK_HOUR_START <= now_time <= PEAK_HOUR_END
+        now_sec = current_time.hour * 3600 + current_time.minute * 60 + current_time.second
+        self.is_peak_hours = _PEAK_START_SEC <= now_sec <= _PEAK_END_SEC
 
         # Check active meter
-        day = current_time.day
-        self.active_meter = "Ground" if day in GROUND_FLOOR_METER_DAYS else "First Floor"
+        self.active_meter = "Ground" if current_time.day < GROUND_FLOOR_METER_CUTOFF else "First Floor"
 
         if self.is_peak_hours:
-            self.system_message = f"Peak hours active ({PEAK_HOUR_START.strftime('%H:%M')} - {PEAK_HOUR_END.strftime('%H:%M')}). Automatic pumping paused."
+            self._message = (_MSG_PEAK_HOURS, {})
         else:
-             self.system_message = f"Active Meter: {self.active_meter}"
+             self._message = (_MSG_ACTIVE_METER, {"meter": self.active_meter})
+
+    def check_time_constraints_if_needed(self, current_time: datetime.datetime) -> bool:
+        """
+        Updates active meter and peak hour status outside a control cycle (e.g. while paused).
+        Peak hours and the meter only change on minute boundaries, so this runs at most once per minute.
+        Returns True if the constraints were re-evaluated.
+        """
+        minute = current_time.replace(second=0, microsecond=0)
+        if minute == self._constraints_minute:
+            return False
+        self._constraints_minute = minute
+        self._check_time_constraints(current_time)
+        return True
+
+    def _rules_for_levels(self, ml_level: float, ug_level: float, oh_level: float) -> list:
+        """Returns the rule ids for every pump as [pump][is_on] for the given levels."""
+        if DEBUG_RULES or self._decision_table is None:
+            # Legacy path: evaluate the branchy rules directly (parity checks, or thresholds off the bin grid)
+            return [[_evaluate_rule(pid, on, ml_level, ug_level, oh_level) for on in (False, True)]
+                    for pid in _PUMP_ORDER]
+        return self._decision_table[
+            int(ml_level / DECISION_TABLE_BIN_PCT),
+            int(ug_level / DECISION_TABLE_BIN_PCT),
+            int(oh_level / DECISION_TABLE_BIN_PCT),
+        ].tolist()
+
+    def _apply_rule(self, pump_id: str, rule: int, ml_level: float, ug_level: float, oh_level: float) -> None:
+        """Carries out the action and status message of an automatic rule."""
+        if rule == _RULE_NONE:
+            return
+        action, reason, message = _RULES[rule]
+        debounce = rule not in _UNDEBOUNCED_RULES
+        if action == 'STOP':
+            self._handle_pump_stop(pump_id, reason.format(ml=ml_level, ug=ug_level, oh=oh_level), debounce=debounce)
+        elif action == 'START':
+            self._handle_pump_start(pump_id, reason.format(ml=ml_level, ug=ug_level, oh=oh_level), debounce=debounce)
+        if message is not None:
+            self._message = (message, {"ml": ml_level, "ug": ug_level, "oh": oh_level})
 
     def _log_action(self, pump_id: str, action: str, reason: str, details: Optional[str] = None) -> None:
-        """Helper to log actions with current state."""
+        """Helper to log actions with current state. Consecutive duplicates per pump are counted, not logged."""
+        key = (action, reason)
+        if self._last_log_key.get(pump_id) == key:
+            self._repeat_counts[pump_id] = self._repeat_counts.get(pump_id, 0) + 1
+            if self._repeat_counts[pump_id] >= LOG_REPEAT_FLUSH_COUNT:
+                self._flush_repeats(pump_id)
+            return
+        self._flush_repeats(pump_id)
+        self._last_log_key[pump_id] = key
         log_pump_action(
             pump_id=pump_id,
             action=action,
@@ -71,45 +302,79 @@ class AutomationController:
             details=details
         )
 
-    def _handle_pump_stop(self, pump_id: str, reason: str, action_type: str = 'STOP') -> None:
-        """Stops a pump and logs the action."""
+    def _flush_repeats(self, pump_id: str) -> None:
+        """Logs one INFO row summarizing suppressed repeats of the pump's last log entry."""
+        count = self._repeat_counts.pop(pump_id, 0)
+        if count:
+            _, reason = self._last_log_key[pump_id]
+            log_pump_action(
+                pump_id=pump_id,
+                action='INFO',
+                reason=reason,
+                levels=self.last_levels,
+                active_meter=self.active_meter,
+                details=f"repeated {count}x"
+            )
+
+    def _handle_pump_stop(self, pump_id: str, reason: str, action_type: str = 'STOP', debounce: bool = False) -> None:
+        """
+        Stops a pump and logs the action. With `debounce` (automatic rule decisions only),
+        a pump that changed state less than MIN_PUMP_DWELL_SECONDS ago is left running.
+        """
+        pump = self.pumps[pump_id]
+        if not pump.is_on():
+            return
+        if debounce and not pump.dwell_elapsed(self._now):
+            return # Let the pump hold its state for the minimum dwell time
+        self._set_pump_state(pump_id, PumpState.OFF, reason=reason)
+        self._log_action(pump_id, action_type, reason)
+
+    def _handle_pump_start(self, pump_id: str, reason: str, manual: bool = False, debounce: bool = False) -> bool:
+        """
+        Attempts to start a pump, checking pressure and logging. With `debounce` (automatic
+        rule decisions only), a pump that stopped less than MIN_PUMP_DWELL_SECONDS ago stays off.
+        """
         pump = self.pumps[pump_id]
         if pump.is_on():
-            pump.set_state(PumpState.OFF, reason=reason)
+            return True # Already running
+        if debounce and not pump.dwell_elapsed(self._now):
+            return False # Let the pump hold its state for the minimum dwell time
+        if self._pressure_ok(pump_id):
+            new_state = PumpState.MANUAL_ON if manual else PumpState.ON
+            self._set_pump_state(pump_id, new_state, reason=reason)
+            action_type = 'MANUAL_START' if manual else 'START'
             self._log_action(pump_id, action_type, reason)
-
-    def _handle_pump_start(self, pump_id: str, reason: str, manual: bool = False) -> bool:
-        """Attempts to start a pump, checking pressure and logging."""
-        pump = self.pumps[pump_id]
-        if not pump.is_on(): # Only attempt to start if it's off
-            if check_pump_pressure(pump_id):
-                new_state = PumpState.MANUAL_ON if manual else PumpState.ON
-                pump.set_state(new_state, reason=reason)
-                action_type = 'MANUAL_START' if manual else 'START'
-                self._log_action(pump_id, action_type, reason)
-                return True
-            else:
-                error_reason = "Zero Pressure Detected"
-                pump.set_state(PumpState.ERROR, reason=error_reason)
-                self._log_action(pump_id, 'ERROR', error_reason)
-                return False
-        return True # Already running or successfully started
-
-    def run_control_cycle(self, current_time: datetime.datetime) -> None:
+            return True
+        error_reason = "Zero Pressure Detected"
+        self._set_pump_state(pump_id, PumpState.ERROR, reason=error_reason)
+        self._log_action(pump_id, 'ERROR', error_reason)
+        return False
+
+    def run_control_cycle(
+        self,
+        current_time: datetime.datetime,
+        *,
+        # Constants bound as defaults: read as fast locals instead of global lookups every cycle
+        _bypass_min_ml: float = P1_MANUAL_BYPASS_MIN_MAIN_LINE,
+        _warn_oh: float = P3_WARN_THRESHOLD_OVERHEAD,
+        _warn_ug_low: float = P3_WARN_THRESHOLD_UNDERGROUND_LOW,
+        _warn_ug_high: float = P3_WARN_THRESHOLD_UNDERGROUND_HIGH,
+        _on_states: FrozenSet[PumpState] = ON_STATES,
+        _not_automatic_states: FrozenSet[PumpState] = _NOT_AUTOMATIC_STATES,
+    ) -> None:
         """Executes one cycle of the automation logic."""
-        self.warnings = [] # Clear previous warnings
-        self.system_message = None # Clear previous message
+        self._now = current_time
+        self._constraints_minute = None # The cycle may replace the time-constraint message
+        self.warnings.clear() # Clear previous warnings (reuse the list)
+        self._message = None # Clear previous message
+        self._pressures.clear() # Read lazily by _pressure_ok, at most once per pump per cycle
 
-        # 1. Update time constraints and sensor readings
+        # 1. Update time constraints
         self._check_time_constraints(current_time)
-        self.last_levels = get_current_water_levels()
-        ml_level = self.last_levels.get("main_line", 0.0)
-        ug_level = self.last_levels.get("underground", 0.0)
-        oh_level = self.last_levels.get("overhead", 0.0)
 
         # 2. Update tank levels based on current pump states (from previous cycle)
         # This simulates water movement between checks
-        update_tank_levels(self.get_pump_states(), current_time)
+        update_tank_levels(self._on_mask(), current_time.hour)
         # Get updated levels after simulation step
         self.last_levels = get_current_water_levels()
         ml_level = self.last_levels.get("main_line", 0.0)
@@ -119,13 +384,14 @@ class AutomationController:
 
         # --- Safety Checks and Peak Hour Stops ---
         # Stop all pumps if pressure fails during operation or if peak hours start
-        for pump_id, pump in self.pumps.items():
-            if pump.is_on():
-                if self.is_peak_hours and pump.state != PumpState.MANUAL_ON: # Stop auto pumps during peak
+        for pump_id, pump in self.pump_items:
+            state = pump.state
+            if state in _on_states:
+                if self.is_peak_hours and state != PumpState.MANUAL_ON: # Stop auto pumps during peak
                      self._handle_pump_stop(pump_id, "Peak hours started")
-                elif not check_pump_pressure(pump_id):
+                elif not self._pressure_ok(pump_id):
                     error_reason = "Zero Pressure Detected during operation"
-                    pump.set_state(PumpState.ERROR, reason=error_reason)
+                    self._set_pump_state(pump_id, PumpState.ERROR, reason=error_reason)
                     self._log_action(pump_id, 'ERROR', error_reason)
 
 
@@ -134,18 +400,18 @@ class AutomationController:
         if self.manual_override["P1"]:
             if self.is_peak_hours:
                  self.warnings.append("P1 Manual Start ignored during peak hours.")
-            elif ml_level < P1_MANUAL_BYPASS_MIN_MAIN_LINE:
-                 self.warnings.append(f"P1 Manual Start failed: Main Line Tank < {P1_MANUAL_BYPASS_MIN_MAIN_LINE}%")
-                 self._handle_pump_stop(pump_id, f"Manual start condition not met (Main Line < {P1_MANUAL_BYPASS_MIN_MAIN_LINE}%)")
-            elif not self.pumps["P1"].is_on():
+            elif ml_level < _bypass_min_ml:
+                 self.warnings.append(f"P1 Manual Start failed: Main Line Tank < {_bypass_min_ml}%")
+                 self._handle_pump_stop("P1", f"Manual start condition not met (Main Line < {_bypass_min_ml}%)")
+            elif self._state[PumpIdx.P1] not in _on_states:
                  self._handle_pump_start("P1", "Manual Override Activated", manual=True)
             # Keep it running manually unless stopped or error
-        elif self.pumps["P1"].state == PumpState.MANUAL_ON:
+        elif self._state[PumpIdx.P1] == PumpState.MANUAL_ON:
              # Allow manual run to continue unless explicitly stopped or error
              # Check stop conditions that might apply even to manual? e.g., pressure
-             if not check_pump_pressure("P1"):
+             if not self._pressure_ok("P1"):
                   error_reason = "Zero Pressure Detected during manual operation"
-                  self.pumps["P1"].set_state(PumpState.ERROR, reason=error_reason)
+                  self._set_pump_state("P1", PumpState.ERROR, reason=error_reason)
                   self._log_action("P1", 'ERROR', error_reason)
 
 
@@ -153,105 +419,62 @@ class AutomationController:
         if self.manual_override["P2"]:
              if self.is_peak_hours:
                  self.warnings.append("P2 Manual Start ignored during peak hours.")
-             elif not self.pumps["P2"].is_on():
+             elif self._state[PumpIdx.P2] not in _on_states:
                   self._handle_pump_start("P2", "Manual Override Activated", manual=True)
              # Keep it running manually unless stopped or error
-        elif self.pumps["P2"].state == PumpState.MANUAL_ON:
-             if not check_pump_pressure("P2"):
+        elif self._state[PumpIdx.P2] == PumpState.MANUAL_ON:
+             if not self._pressure_ok("P2"):
                   error_reason = "Zero Pressure Detected during manual operation"
-                  self.pumps["P2"].set_state(PumpState.ERROR, reason=error_reason)
+                  self._set_pump_state("P2", PumpState.ERROR, reason=error_reason)
                   self._log_action("P2", 'ERROR', error_reason)
 
 
         # --- Automatic Pump Logic (only if not peak hours and no errors) ---
         if not self.is_peak_hours:
+            rules = self._rules_for_levels(ml_level, ug_level, oh_level)
+
             # Pump P3 Logic (Highest Priority Consumer)
             pump3 = self.pumps["P3"]
-            if pump3.state != PumpState.ERROR:
-                # Conditions to STOP P3
-                if pump3.is_on() and (oh_level >= P3_START_THRESHOLD_OVERHEAD + 5.0): # Stop with a buffer
-                     self._handle_pump_stop("P3", f"Overhead Tank reached {oh_level:.1f}%")
-                elif pump3.is_on() and ug_level < P3_STOP_THRESHOLD_UNDERGROUND:
-                     self._handle_pump_stop("P3", f"Underground Tank fell below {P3_STOP_THRESHOLD_UNDERGROUND}%")
-                     self.system_message = f"P3 stopped. Underground low ({ug_level:.1f}%). Requesting fill."
-                     # Signal P1/P2 logic will handle the request below
-
-                # Conditions to START P3 (if off)
-                elif not pump3.is_on() and oh_level < P3_START_THRESHOLD_OVERHEAD:
-                    if ug_level >= P3_REQ_UNDERGROUND_LEVEL:
-                         self._handle_pump_start("P3", f"Overhead Tank < {P3_START_THRESHOLD_OVERHEAD}%")
-                    else:
-                         # Not enough water in UG tank, signal P1/P2 needed
-                         self.system_message = f"P3 needs to start (Overhead < {P3_START_THRESHOLD_OVERHEAD}%) but Underground level ({ug_level:.1f}%) is below required {P3_REQ_UNDERGROUND_LEVEL}%."
-                         # P1/P2 logic will check if they need to run based on this implicit signal
-
-                # Warnings for P3 operation
+            state = pump3.state
+            if state != PumpState.ERROR:
+                self._apply_rule("P3", rules[PumpIdx.P3][state in _on_states], ml_level, ug_level, oh_level)
+
+                # Warnings for P3 operation (re-read: the rule may have just started/stopped it)
                 if pump3.is_on():
-                    if oh_level < P3_WARN_THRESHOLD_OVERHEAD:
-                        self.warnings.append(f"Warning: P3 running with Overhead Tank level low ({oh_level:.1f}% < {P3_WARN_THRESHOLD_OVERHEAD}%)")
-                    if P3_WARN_THRESHOLD_UNDERGROUND_LOW <= ug_level < P3_WARN_THRESHOLD_UNDERGROUND_HIGH:
+                    if oh_level < _warn_oh:
+                        self.warnings.append(f"Warning: P3 running with Overhead Tank level low ({oh_level:.1f}% < {_warn_oh}%)")
+                    if _warn_ug_low <= ug_level < _warn_ug_high:
                          self.warnings.append(f"Warning: P3 running with Underground Tank level low ({ug_level:.1f}%)")
 
 
             # Pump P1 Logic (Primary Supply) - only if not manually controlled
-            pump1 = self.pumps["P1"]
-            if pump1.state not in [PumpState.ERROR, PumpState.MANUAL_ON]:
-                 # Conditions to STOP P1
-                 if pump1.is_on():
-                     if ml_level < P1_STOP_THRESHOLD_MAIN_LINE:
-                         self._handle_pump_stop("P1", f"Main Line Tank < {P1_STOP_THRESHOLD_MAIN_LINE}%")
-                     elif ug_level >= P3_SIGNAL_TARGET_UNDERGROUND + 5.0: # Stop if UG tank is sufficiently full (e.g. filled after P3 request)
-                         self._handle_pump_stop("P1", f"Underground Tank reached target level ({ug_level:.1f}%)")
-
-                 # Conditions to START P1 (if off)
-                 elif not pump1.is_on():
-                     # Start if UG is low OR if P3 signaled for more water (UG < P3_REQ_UNDERGROUND_LEVEL)
-                     needs_fill = ug_level < P1_START_THRESHOLD_UNDERGROUND or ug_level < P3_REQ_UNDERGROUND_LEVEL
-                     if needs_fill and ml_level >= P1_REQ_MAIN_LINE_LEVEL:
-                         self._handle_pump_start("P1", f"Underground Tank < {max(P1_START_THRESHOLD_UNDERGROUND, P3_REQ_UNDERGROUND_LEVEL)}%")
-                     elif needs_fill and ml_level < P1_REQ_MAIN_LINE_LEVEL:
-                          self.system_message = f"P1 cannot start: Underground needs fill ({ug_level:.1f}%) but Main Line level ({ml_level:.1f}%) is below required {P1_REQ_MAIN_LINE_LEVEL}%."
+            state = self.pumps["P1"].state
+            if state not in _not_automatic_states:
+                 self._apply_rule("P1", rules[PumpIdx.P1][state in _on_states], ml_level, ug_level, oh_level)
 
 
             # Pump P2 Logic (Backup Supply) - only if not manually controlled
-            pump2 = self.pumps["P2"]
-            if pump2.state not in [PumpState.ERROR, PumpState.MANUAL_ON]:
-                 # Conditions to STOP P2
-                 if pump2.is_on() and ug_level >= P2_STOP_THRESHOLD_UNDERGROUND:
-                      self._handle_pump_stop("P2", f"Underground Tank reached {P2_STOP_THRESHOLD_UNDERGROUND}%")
-
-                 # Conditions to START P2 (if off)
-                 # Start if Main Line is very low AND Underground is very low AND Overhead is very low
-                 # OR if P3 signaled and P1 cannot run
-                 elif not pump2.is_on():
-                     critical_levels = (ml_level < P2_START_THRESHOLD_MAIN_LINE and
-                                       ug_level < P2_START_THRESHOLD_UNDERGROUND and
-                                       oh_level < P2_START_THRESHOLD_OVERHEAD)
-                     p3_needs_water_p1_cant = (ug_level < P3_REQ_UNDERGROUND_LEVEL and
-                                              ml_level < P1_REQ_MAIN_LINE_LEVEL) # P1 can't fulfill P3's need
-
-                     if critical_levels:
-                           self._handle_pump_start("P2", "Critical low levels detected in all tanks")
-                     elif p3_needs_water_p1_cant:
-                           self._handle_pump_start("P2", f"Backup needed: P3 requires water and P1 cannot run (Main Line {ml_level:.1f}%)")
+            state = self.pumps["P2"].state
+            if state not in _not_automatic_states:
+                 self._apply_rule("P2", rules[PumpIdx.P2][state in _on_states], ml_level, ug_level, oh_level)
 
 
     def request_manual_override(self, pump_id: str, enable: bool) -> None:
         """Handles requests from the UI to enable/disable manual override."""
         if pump_id in self.manual_override:
             if enable and self.pumps[pump_id].state == PumpState.ERROR:
-                 logging.warning(f"Cannot enable manual override for {pump_id}, pump is in ERROR state.")
+                 logger.warning("Cannot enable manual override for %s, pump is in ERROR state.", pump_id)
                  self.warnings.append(f"Cannot manually start {pump_id} while in ERROR state.")
                  return # Don't enable override if pump is in error
 
             self.manual_override[pump_id] = enable
-            logging.info(f"Manual override for {pump_id} set to {enable}")
+            logger.info("Manual override for %s set to %s", pump_id, enable)
 
             if not enable: # If disabling manual override
                 pump = self.pumps[pump_id]
                 if pump.state == PumpState.MANUAL_ON:
                     # Stop the pump if it was running manually
-                    pump.set_state(PumpState.OFF, reason="Manual Override Disabled")
+                    self._set_pump_state(pump_id, PumpState.OFF, reason="Manual Override Disabled")
                     self._log_action(pump_id, 'MANUAL_STOP', "Manual Override Disabled")
             # If enabling, the main control loop will handle starting it if conditions allow
 
@@ -260,8 +483,8 @@ class AutomationController:
         if pump_id in self.pumps:
             pump = self.pumps[pump_id]
             if pump.state == PumpState.ERROR:
-                pump.set_state(PumpState.OFF, reason="Error Reset by User")
+                self._set_pump_state(pump_id, PumpState.OFF, reason="Error Reset by User")
                 self._log_action(pump_id, 'INFO', "Error Reset by User")
-                logging.info(f"Error state for pump {pump_id} reset.")
+                logger.info("Error state for pump %s reset.", pump_id)
             else:
-                logging.warning(f"Attempted to reset error on pump {pump_id}, but it was not in error state.")
+                logger.warning("Attempted to reset error on pump %s, but it was not in error state.", pump_id)
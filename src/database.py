@@ -3,54 +3,141 @@
 Handles database interactions for logging pump operations.
 Uses SQLite.
 """
+import os
 import sqlite3
 import datetime
-from typing import List, Tuple, Optional
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Tuple, Optional
 import logging
 
-from config import DATABASE_PATH
+from config import DATA_DIR, DATABASE_PATH, LOG_FLUSH_INTERVAL_SECONDS
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-def get_db_connection() -> sqlite3.Connection:
-    """Establishes a connection to the SQLite database."""
+# Shared connections, opened lazily and reused for every call. The writer skips
+# type parsing and the Row factory, which only the reader needs.
+_WRITER: Optional[sqlite3.Connection] = None
+_READER: Optional[sqlite3.Connection] = None
+_WRITE_LOCK = threading.Lock() # Serializes access; Streamlit may call from different threads
+_READ_LOCK = threading.Lock()
+
+# Log rows waiting to be written; drained in batches by the flush thread
+_log_queue: Deque[Tuple] = deque()
+_flush_thread: Optional[threading.Thread] = None
+
+_INSERT_SQL = """
+    INSERT INTO pump_logs (
+        timestamp, pump_id, action, reason,
+        main_line_level_pct, underground_level_pct, overhead_level_pct,
+        active_meter, details
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _open_connection(**kwargs) -> sqlite3.Connection:
+    """Opens a connection to the SQLite database that is closed at exit."""
     try:
-        conn = sqlite3.connect(DATABASE_PATH, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        conn.row_factory = sqlite3.Row # Return rows as dictionary-like objects
-        logging.debug("Database connection established.")
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, **kwargs)
+        atexit.register(conn.close)
+        logger.debug("Database connection established.")
         return conn
     except sqlite3.Error as e:
-        logging.error(f"Database connection error: {e}")
+        logger.error("Database connection error: %s", e)
         raise
 
+def _writer_conn() -> sqlite3.Connection:
+    """Returns the shared connection used for schema setup and inserts."""
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = _open_connection()
+    return _WRITER
+
+def _reader_conn() -> sqlite3.Connection:
+    """Returns the shared connection used for reading logs."""
+    global _READER
+    if _READER is None:
+        conn = _open_connection(detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        conn.row_factory = sqlite3.Row # Return rows as dictionary-like objects
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _READER = conn
+    return _READER
+
+def get_db_connection() -> sqlite3.Connection:
+    """Returns the shared read connection to the SQLite database (rows as sqlite3.Row)."""
+    return _reader_conn()
+
 def create_tables() -> None:
-    """Creates the pump_logs table if it doesn't exist."""
-    conn = get_db_connection()
+    """Creates the pump_logs table if it doesn't exist and tunes the write connection."""
+    # Ensure data directory exists
+    os.makedirs(DATA_DIR, exist_ok=True)
+    logger.info("Database will be stored at: %s", DATABASE_PATH)
+    conn = _writer_conn()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pump_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME NOT NULL,
-                pump_id TEXT NOT NULL,
-                action TEXT NOT NULL CHECK(action IN ('START', 'STOP', 'ERROR', 'INFO', 'MANUAL_START', 'MANUAL_STOP')),
-                reason TEXT,
-                main_line_level_pct REAL,
-                underground_level_pct REAL,
-                overhead_level_pct REAL,
-                active_meter TEXT,
-                details TEXT
-            )
-        """)
-        conn.commit()
-        logging.info("Database table 'pump_logs' checked/created successfully.")
+        with _WRITE_LOCK:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pump_logs (
+                    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME NOT NULL,
+                    pump_id TEXT NOT NULL,
+                    action TEXT NOT NULL CHECK(action IN ('START', 'STOP', 'ERROR', 'INFO', 'MANUAL_START', 'MANUAL_STOP')),
+                    reason TEXT,
+                    main_line_level_pct REAL,
+                    underground_level_pct REAL,
+                    overhead_level_pct REAL,
+                    active_meter TEXT,
+                    details TEXT
+                )
+            """)
+            conn.commit()
+            # WAL avoids a full fsync per commit; the log is not critical enough to need FULL sync
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        logger.info("Database table 'pump_logs' checked/created successfully.")
     except sqlite3.Error as e:
-        logging.error(f"Error creating database table: {e}")
-    finally:
-        if conn:
-            conn.close()
-            logging.debug("Database connection closed after table creation.")
+        logger.error("Error creating database table: %s", e)
+    _start_flush_thread()
+
+def flush_logs() -> None:
+    """Writes all queued log rows to the database in a single transaction."""
+    batch = []
+    # The flush thread and readers both drain the queue, so popleft() itself is the emptiness check
+    while True:
+        try:
+            batch.append(_log_queue.popleft())
+        except IndexError:
+            break
+    if not batch:
+        return
+    conn = _writer_conn()
+    try:
+        with _WRITE_LOCK:
+            conn.executemany(_INSERT_SQL, batch)
+            conn.commit()
+        logger.debug("Flushed %d log rows.", len(batch))
+    except sqlite3.Error as e:
+        logger.error("Error flushing pump logs: %s", e)
+
+def _flush_loop() -> None:
+    """Background loop that periodically drains the log queue."""
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL_SECONDS)
+        try:
+            flush_logs()
+        except Exception:
+            logger.exception("Log flush failed.") # Keep the thread alive; the next flush retries
+
+def _start_flush_thread() -> None:
+    """Starts the background flush thread once per process."""
+    global _flush_thread
+    if _flush_thread is not None:
+        return
+    _flush_thread = threading.Thread(target=_flush_loop, name="log-flush", daemon=True)
+    _flush_thread.start()
+    atexit.register(flush_logs) # Runs before the connections are closed (atexit is LIFO)
 
 def log_pump_action(
     pump_id: str,
@@ -60,54 +147,33 @@ def log_pump_action(
     active_meter: str,
     details: Optional[str] = None
 ) -> None:
-    """Logs a pump action or system event to the database."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        timestamp = datetime.datetime.now()
-        cursor.execute("""
-            INSERT INTO pump_logs (
-                timestamp, pump_id, action, reason,
-                main_line_level_pct, underground_level_pct, overhead_level_pct,
-                active_meter, details
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            timestamp, pump_id, action, reason,
-            levels.get('main_line', None), levels.get('underground', None), levels.get('overhead', None),
-            active_meter, details
-        ))
-        conn.commit()
-        logging.info(f"Logged: Pump={pump_id}, Action={action}, Reason={reason}, Meter={active_meter}")
-    except sqlite3.Error as e:
-        logging.error(f"Error logging pump action: {e}")
-    finally:
-        if conn:
-            conn.close()
-            logging.debug("Database connection closed after logging.")
+    """Queues a pump action or system event to be written to the database."""
+    # Stored as text up front (same format as sqlite3's datetime adapter) so inserts skip the adapter
+    timestamp = datetime.datetime.now().isoformat(" ")
+    _log_queue.append((
+        timestamp, pump_id, action, reason,
+        levels.get('main_line', None), levels.get('underground', None), levels.get('overhead', None),
+        active_meter, details
+    ))
+    logger.info("Logged: Pump=%s, Action=%s, Reason=%s, Meter=%s", pump_id, action, reason, active_meter)
 
-def get_recent_logs(limit: int = 50) -> List[sqlite3.Row]:
-    """Retrieves the most recent log entries."""
-    conn = get_db_connection()
+def get_logs_since(last_id: int, limit: int = 100) -> List[sqlite3.Row]:
+    """Retrieves log entries newer than last_id, newest first (at most `limit`)."""
+    flush_logs() # Make queued entries visible to the reader
+    conn = _reader_conn()
     logs = []
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT timestamp, pump_id, action, reason, main_line_level_pct, underground_level_pct, overhead_level_pct, active_meter, details
-            FROM pump_logs
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
-        logs = cursor.fetchall()
-        logging.debug(f"Retrieved {len(logs)} recent logs.")
+        with _READ_LOCK:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT log_id, timestamp, pump_id, action, reason, main_line_level_pct, underground_level_pct, overhead_level_pct, active_meter, details
+                FROM pump_logs
+                WHERE log_id > ?
+                ORDER BY log_id DESC
+                LIMIT ?
+            """, (last_id, limit))
+            logs = cursor.fetchall()
+        logger.debug("Retrieved %d new logs since id %d.", len(logs), last_id)
     except sqlite3.Error as e:
-        logging.error(f"Error retrieving logs: {e}")
-    finally:
-        if conn:
-            conn.close()
-            logging.debug("Database connection closed after retrieving logs.")
+        logger.error("Error retrieving new logs: %s", e)
     return logs
-
-# --- Initial Setup ---
-# Create tables when the module is imported for the first time.
-if __name__ != "__main__":
-    create_tables()
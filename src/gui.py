@@ -6,139 +6,198 @@ Displays system status, tank levels, logs, and allows manual control.
 import streamlit as st
 import pandas as pd
 import datetime
-import time # For sleep
 
 from controller import AutomationController
-from database import get_recent_logs
-from sensors import reset_simulation, get_current_water_levels
+from runner import SimRunner
+from database import create_tables, get_logs_since
+from sensors import reset_simulation
 from config import APP_TITLE, STATE_UPDATE_INTERVAL, SIMULATION_INTERVAL_SECONDS, P1_MANUAL_BYPASS_MIN_MAIN_LINE
 from pumps import PumpState
 
+TANK_LABELS = {"main_line": "Main Line", "underground": "Underground", "overhead": "Overhead"}
+# Pumps that can be run manually, with their button tooltips
+MANUAL_PUMP_TOOLTIPS = {
+    "P1": f"Manually run P1. Requires Main Line > {P1_MANUAL_BYPASS_MIN_MAIN_LINE}%. Cannot run during peak hours.",
+    "P2": "Manually run P2 (Boring Well). Cannot run during peak hours.",
+}
+LOG_TABLE_ROWS = 100 # Number of most recent log entries shown
+LOG_PCT_COLUMNS = ['main_line_level_pct', 'underground_level_pct', 'overhead_level_pct']
+LOG_DISPLAY_COLUMNS = ['timestamp', 'pump_id', 'action', 'reason', 'main_line_level_pct', 'underground_level_pct', 'overhead_level_pct', 'active_meter', 'details']
+
+@st.cache_resource
+def get_sim_runner() -> SimRunner:
+    """
+    Returns the process-wide controller and background control loop.
+    The tank simulation is module-level state in sensors.py, so every browser session
+    shares one runner instead of each starting its own loop on the same tanks.
+    Also prepares the log database, once per process, before the controller logs anything.
+    """
+    create_tables()
+    runner = SimRunner(AutomationController())
+    runner.running.set() # Start simulation automatically
+    runner.start()
+    return runner
+
+def reset_sim_runner() -> None:
+    """Stops the shared runner, resets the tanks and starts a fresh controller for all sessions."""
+    old_runner = get_sim_runner()
+    was_running = old_runner.running.is_set() # A paused simulation stays paused after the reset
+    old_runner.stop(wait=True)
+    get_sim_runner.clear()
+    reset_simulation() # Reset tank levels in sensors.py
+    if not was_running:
+        get_sim_runner().running.clear()
+
 def initialize_session_state():
     """Initializes Streamlit session state variables if they don't exist."""
-    if 'controller' not in st.session_state:
-        st.session_state.controller = AutomationController()
-        print("Initialized Controller in session state.")
-    if 'last_run_time' not in st.session_state:
-        # Use a slightly past time to ensure the first run executes
-        st.session_state.last_run_time = datetime.datetime.now() - datetime.timedelta(seconds=STATE_UPDATE_INTERVAL + 1)
-    if 'simulation_running' not in st.session_state:
-        st.session_state.simulation_running = True # Start simulation automatically
-
-def run_simulation_step():
-    """Runs one step of the simulation if enough time has passed."""
-    controller: AutomationController = st.session_state.controller
-    now = datetime.datetime.now()
-
-    # Check if simulation is running and interval has passed
-    if st.session_state.simulation_running :
-        # Run the control cycle - this updates pump states AND simulates water flow
-        controller.run_control_cycle(now)
-        st.session_state.last_run_time = now # Update last run time after execution
-        print(f"Control cycle run at {now}") # DEBUG
-    else:
+    if 'log_df' not in st.session_state:
+        # Formatted log rows shown in the table (newest first) and the newest id already in it
+        st.session_state.log_df = pd.DataFrame(columns=LOG_DISPLAY_COLUMNS)
+        st.session_state.last_log_id = 0
+
+def run_simulation_step(runner: SimRunner):
+    """Keeps time-based constraints current while the control loop is paused."""
+    # Control cycles (pump logic AND water flow) run in the background loop while it is running
+    if not runner.running.is_set():
         # If paused, still update time-based constraints like peak hours/meter
-        controller._check_time_constraints(now) # Use internal method carefully
-        print(f"Simulation paused. Time constraints updated at {now}") # DEBUG
+        with runner.ctrl.lock:
+            changed = runner.ctrl.check_time_constraints_if_needed(datetime.datetime.now())
+        if changed:
+            runner.publish()
+
+
+@st.fragment(run_every=STATE_UPDATE_INTERVAL)
+def display_dashboard():
+    """
+    Displays the main dashboard elements.
+    Runs as a fragment that refreshes every STATE_UPDATE_INTERVAL seconds without rerunning the whole page,
+    drawing the snapshot last published by the background runner.
+    """
+    # Looked up on every run (not passed in) so a reset from any session is picked up
+    runner = get_sim_runner()
+    controller = runner.ctrl
+    run_simulation_step(runner)
+    snapshot = runner.snapshot
 
-
-def display_dashboard(controller: AutomationController):
-    """Displays the main dashboard elements."""
     st.header("System Status")
 
     # Display general messages and warnings
-    if controller.system_message:
-        st.info(controller.system_message)
-    if controller.warnings:
-        for warning in controller.warnings:
-            st.warning(warning)
+    if snapshot.system_message:
+        st.info(snapshot.system_message)
+    for warning in snapshot.warnings:
+        st.warning(warning)
 
     # Layout columns for tanks and pumps
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Tank Levels")
-        levels = get_current_water_levels() # Get the latest levels after simulation step
-        st.progress(int(levels.get("main_line", 0)), text=f"Main Line: {levels.get('main_line', 0):.1f}%")
-        st.progress(int(levels.get("underground", 0)), text=f"Underground: {levels.get('underground', 0):.1f}%")
-        st.progress(int(levels.get("overhead", 0)), text=f"Overhead: {levels.get('overhead', 0):.1f}%")
+        levels = snapshot.levels # Levels as of the latest simulation step
+        for name, label in TANK_LABELS.items():
+            level = levels.get(name, 0)
+            st.progress(int(level), text=f"{label}: {level:.1f}%")
 
     with col2:
         st.subheader("Pump Status")
-        for pump_id, pump in controller.pumps.items():
-            status_text, color = pump.get_status_display()
-            st.markdown(f"**{pump_id}:** <span style='color:{color};'>{status_text}</span>", unsafe_allow_html=True)
-             # Add reset button for pumps in error state
-            if pump.state == PumpState.ERROR:
-                 if st.button(f"Reset Error {pump_id}", key=f"reset_{pump_id}"):
-                     controller.reset_pump_error(pump_id)
-                     st.rerun() # Rerun immediately to reflect the change
-
-
-def display_controls(controller: AutomationController):
-    """Displays control buttons."""
+        # All pumps in one markdown element (hard line breaks between them)
+        st.markdown("  \n".join(f"**{pump_id}:** <span style='color:{color};'>{status_text}</span>"
+                                 for pump_id, status_text, color, _ in snapshot.pumps), unsafe_allow_html=True)
+        # Add reset buttons only for pumps in error state
+        errored = [pump_id for pump_id, _, _, state in snapshot.pumps if state == PumpState.ERROR]
+        for pump_id in errored:
+            if st.button(f"Reset Error {pump_id}", key=f"reset_{pump_id}"):
+                with controller.lock:
+                    controller.reset_pump_error(pump_id)
+                runner.publish()
+                st.rerun() # Rerun immediately to reflect the change
+
+
+def display_controls(runner: SimRunner):
+    """Displays control buttons. They act on the shared runner, so they affect every session."""
+    controller = runner.ctrl
     st.sidebar.header("Controls")
 
     # Simulation Control
-    if st.session_state.simulation_running:
+    if runner.running.is_set():
         if st.sidebar.button("Pause Simulation"):
-            st.session_state.simulation_running = False
+            runner.running.clear()
             st.rerun()
     else:
         if st.sidebar.button("Resume Simulation"):
-            st.session_state.simulation_running = True
+            runner.running.set()
             st.rerun()
 
     if st.sidebar.button("Reset Simulation State"):
-        reset_simulation() # Reset tank levels in sensors.py
         # Re-initialize controller to reset pump states etc.
-        st.session_state.controller = AutomationController()
+        reset_sim_runner()
         st.rerun()
 
     st.sidebar.subheader("Manual Pump Overrides")
-    # P1 Manual Control
-    p1_manual_active = controller.manual_override.get("P1", False)
-    label_p1 = "Deactivate P1 Manual" if p1_manual_active else "Activate P1 Manual"
-    tooltip_p1 = f"Manually run P1. Requires Main Line > {P1_MANUAL_BYPASS_MIN_MAIN_LINE}%. Cannot run during peak hours."
-    if st.sidebar.button(label_p1, key="manual_p1", help=tooltip_p1):
-        controller.request_manual_override("P1", not p1_manual_active)
-        st.rerun()
-
-    # P2 Manual Control
-    p2_manual_active = controller.manual_override.get("P2", False)
-    label_p2 = "Deactivate P2 Manual" if p2_manual_active else "Activate P2 Manual"
-    tooltip_p2 = "Manually run P2 (Boring Well). Cannot run during peak hours."
-    if st.sidebar.button(label_p2, key="manual_p2", help=tooltip_p2):
-        controller.request_manual_override("P2", not p2_manual_active)
-        st.rerun()
+    manual_active = {pump_id: controller.manual_override.get(pump_id, False) for pump_id in MANUAL_PUMP_TOOLTIPS}
+    for pump_id, tooltip in MANUAL_PUMP_TOOLTIPS.items():
+        active = manual_active[pump_id]
+        label = f"Deactivate {pump_id} Manual" if active else f"Activate {pump_id} Manual"
+        if st.sidebar.button(label, key=f"manual_{pump_id.lower()}", help=tooltip):
+            with controller.lock:
+                controller.request_manual_override(pump_id, not active)
+            runner.publish()
+            st.rerun()
 
     # Display current override status
-    st.sidebar.caption(f"P1 Manual Override: {'Active' if p1_manual_active else 'Inactive'}")
-    st.sidebar.caption(f"P2 Manual Override: {'Active' if p2_manual_active else 'Inactive'}")
-
-
+    for pump_id, active in manual_active.items():
+        st.sidebar.caption(f"{pump_id} Manual Override: {'Active' if active else 'Inactive'}")
+
+
+def _format_log_rows(logs) -> pd.DataFrame:
+    """Formats database log rows for display."""
+    # Convert list of Row objects to list of dicts for Pandas
+    log_data = [dict(log) for log in logs]
+    df = pd.DataFrame(log_data)
+    # Format timestamp
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    # Format percentages in one vectorized pass (missing levels stay empty)
+    pct_cols = df.columns.intersection(LOG_PCT_COLUMNS)
+    pct_values = df[pct_cols].astype(float)
+    df[pct_cols] = pct_values.round(1).astype(str).add('%').where(pct_values.notna())
+
+    # Select and reorder columns for display
+    return df[[col for col in LOG_DISPLAY_COLUMNS if col in df.columns]] # Ensure columns exist
+
+
+@st.cache_data(max_entries=4)
+def _log_table_html(last_log_id: int, row_count: int, _log_df: pd.DataFrame) -> str:
+    """
+    Renders the log table as static HTML; refreshes without new logs reuse the cached string.
+    The cache is shared by all sessions, and (last_log_id, row_count) is a sound key across them:
+    log ids are assigned in insert order by the single writer and each flush commits a batch
+    atomically, so a session's table is always the newest `row_count` rows with id <= last_log_id.
+    """
+    return _log_df.fillna("").to_html(index=False, classes="logtbl", border=0)
+
+
+@st.fragment(run_every=STATE_UPDATE_INTERVAL)
 def display_logs():
-    """Displays recent logs from the database."""
+    """
+    Displays recent logs from the database. Refreshes as its own fragment.
+    Only rows newer than the last one shown are fetched and formatted each refresh.
+    """
     st.header("Operation Logs")
-    logs = get_recent_logs(limit=100)
-    if logs:
-        # Convert list of Row objects to list of dicts for Pandas
-        log_data = [dict(log) for log in logs]
-        df = pd.DataFrame(log_data)
-        # Format timestamp
-        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        # Format percentages
-        for col in ['main_line_level_pct', 'underground_level_pct', 'overhead_level_pct']:
-             if col in df.columns:
-                 df[col] = df[col].map('{:.1f}%'.format, na_action='ignore')
-
-        # Select and reorder columns for display
-        display_columns = ['timestamp', 'pump_id', 'action', 'reason', 'main_line_level_pct', 'underground_level_pct', 'overhead_level_pct', 'active_meter', 'details']
-        df_display = df[[col for col in display_columns if col in df.columns]] # Ensure columns exist
-
-        st.dataframe(df_display, use_container_width=True)
-    else:
+    new_logs = get_logs_since(st.session_state.last_log_id, limit=LOG_TABLE_ROWS)
+    if new_logs:
+        st.session_state.last_log_id = new_logs[0]['log_id']
+        new_df = _format_log_rows(new_logs)
+        log_df = st.session_state.log_df
+        if log_df.empty:
+            st.session_state.log_df = new_df
+        else:
+            st.session_state.log_df = pd.concat([new_df, log_df.head(LOG_TABLE_ROWS - len(new_df))], ignore_index=True)
+
+    log_df = st.session_state.log_df
+    if log_df.empty:
         st.info("No log entries yet.")
+    else:
+        # The rows are read-only, so a static table is cheaper to send and draw than the grid
+        st.markdown(_log_table_html(st.session_state.last_log_id, len(log_df), log_df), unsafe_allow_html=True)
 
 
 def main_gui():
@@ -147,23 +206,12 @@ def main_gui():
     st.title(APP_TITLE)
 
     initialize_session_state()
-    controller = st.session_state.controller
-
-    # Run simulation step logic
-    run_simulation_step()
+    runner = get_sim_runner()
 
     # Display UI elements
-    display_dashboard(controller)
-    display_controls(controller)
+    # The dashboard and logs are fragments that refresh themselves every STATE_UPDATE_INTERVAL;
+    # the sidebar controls only rerun on interaction, so their widgets aren't rebuilt each tick.
+    display_dashboard()
+    display_controls(runner)
     display_logs()
 
-    # Trigger periodic rerun using time.sleep
-    # Note: Streamlit reruns automatically on widget interaction.
-    # This sleep ensures updates even without interaction.
-    # Be cautious with sleep in Streamlit; it blocks execution.
-    # A background thread might be better for complex/long-running tasks,
-    # but for this simulation, periodic reruns are acceptable.
-    time.sleep(STATE_UPDATE_INTERVAL)
-    if st.session_state.simulation_running:
-        st.rerun()
-
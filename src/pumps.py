@@ -2,63 +2,104 @@
 """
 Defines the Pump class representing the state and basic operations of a pump.
 """
-from enum import Enum, auto
+from enum import IntEnum, auto
+import datetime
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import numpy as np
 
-class PumpState(Enum):
-    """Possible states for a pump."""
+from config import MIN_PUMP_DWELL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class PumpState(IntEnum):
+    """Possible states for a pump. Integer valued so states can be stored in numpy arrays."""
     OFF = auto()
     ON = auto()
     ERROR = auto()
     MANUAL_ON = auto() # State for when manually activated
 
+# Lookups on raw int8 values from a state array, without constructing a PumpState per read
+_STATE_BY_VALUE = {state.value: state for state in PumpState}
+ON_STATES = frozenset({PumpState.ON, PumpState.MANUAL_ON}) # Hashes equal the raw ints, so array values match too
+
+class PumpIdx(IntEnum):
+    """Position of each pump in a shared pump-state array."""
+    P1 = 0
+    P2 = 1
+    P3 = 2
+
+# Display label and color per state; ERROR is built on demand since it includes the message
+_STATUS = {
+    PumpState.ON: ("ON (Auto)", "green"),
+    PumpState.MANUAL_ON: ("ON (Manual)", "orange"),
+    PumpState.OFF: ("OFF", "grey"),
+}
+
 class Pump:
-    """Represents a single water pump."""
-    def __init__(self, pump_id: str):
+    """
+    Represents a single water pump.
+    The state is kept in one slot of a shared int8 array (indexed by PumpIdx) so the
+    controller can read all pumps at once; a standalone Pump owns a one-slot array.
+    """
+    __slots__ = ("pump_id", "_states", "_idx", "error_message", "last_change")
+
+    def __init__(self, pump_id: str, states: Optional[np.ndarray] = None, idx: int = 0):
         self.pump_id = pump_id
-        self.state: PumpState = PumpState.OFF
+        if states is None:
+            states, idx = np.empty(1, dtype=np.int8), 0
+        self._states = states
+        self._idx = idx
+        self.state = PumpState.OFF
         self.error_message: str | None = None
-        logging.info(f"Pump {self.pump_id} initialized in state {self.state.name}")
+        self.last_change: Optional[datetime.datetime] = None # When the state last changed
+        logger.info("Pump %s initialized in state %s", self.pump_id, self.state.name)
+
+    @property
+    def state(self) -> PumpState:
+        """The current state, read from the shared state array."""
+        return _STATE_BY_VALUE[int(self._states[self._idx])]
+
+    @state.setter
+    def state(self, new_state: PumpState) -> None:
+        self._states[self._idx] = new_state
 
     def get_state(self) -> PumpState:
         """Returns the current state of the pump."""
         return self.state
 
-    def set_state(self, new_state: PumpState, reason: str = "") -> None:
-        """Sets the pump state, logging if it changes."""
-        if self.state != new_state:
-            old_state = self.state.name
-            self.state = new_state
-            self.error_message = reason if new_state == PumpState.ERROR else None
-            logging.info(f"Pump {self.pump_id} state changed from {old_state} to {self.state.name}. Reason: {reason if reason else 'N/A'}")
-        # If setting to ERROR, ensure reason is stored
-        elif new_state == PumpState.ERROR and self.error_message != reason:
-             self.error_message = reason
-             logging.warning(f"Pump {self.pump_id} updated error reason: {reason}")
+    def set_state(self, new_state: PumpState, reason: str = "", changed_at: Optional[datetime.datetime] = None) -> None:
+        """Sets the pump state, logging if it changes. Re-setting the current state is a no-op."""
+        old_state = self.state
+        if old_state == new_state:
+            # Only a new reason for an existing ERROR is worth recording
+            if new_state == PumpState.ERROR and self.error_message != reason:
+                self.error_message = reason
+                logger.warning("Pump %s updated error reason: %s", self.pump_id, reason)
+            return
+        self.state = new_state
+        self.last_change = changed_at or datetime.datetime.now()
+        self.error_message = reason if new_state == PumpState.ERROR else None
+        logger.info("Pump %s state changed from %s to %s. Reason: %s", self.pump_id, old_state.name, new_state.name, reason or 'N/A')
+
 
+    def dwell_elapsed(self, now: datetime.datetime) -> bool:
+        """Checks if the pump has held its current state for at least MIN_PUMP_DWELL_SECONDS."""
+        return self.last_change is None or (now - self.last_change).total_seconds() >= MIN_PUMP_DWELL_SECONDS
 
     def is_on(self) -> bool:
         """Checks if the pump is currently running (automatically or manually)."""
-        return self.state in [PumpState.ON, PumpState.MANUAL_ON]
+        return int(self._states[self._idx]) in ON_STATES
 
     def get_status_display(self) -> Tuple[str, str]:
         """Returns a display string and color for the UI."""
-        if self.state == PumpState.ON:
-            return "ON (Auto)", "green"
-        elif self.state == PumpState.MANUAL_ON:
-            return "ON (Manual)", "orange"
-        elif self.state == PumpState.OFF:
-            return "OFF", "grey"
-        elif self.state == PumpState.ERROR:
-            return f"ERROR ({self.error_message})", "red"
-        return "Unknown", "black" # Should not happen
+        status = _STATUS.get(self.state)
+        return status if status else (f"ERROR ({self.error_message})", "red")
 
 # Example usage (for testing module directly)
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     p1 = Pump("P1")
     print(f"P1 initial state: {p1.get_state().name}")
     p1.set_state(PumpState.ON, reason="Low underground tank")
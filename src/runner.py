@@ -0,0 +1,107 @@
+# src/runner.py
+"""
+Drives the automation controller in the background.
+Control cycles run on an asyncio event loop in a daemon thread, independent of Streamlit reruns,
+and each cycle publishes a snapshot of the state the dashboard displays.
+"""
+import asyncio
+import datetime
+import threading
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from config import SIMULATION_INTERVAL_SECONDS
+from controller import AutomationController
+from pumps import PumpState
+from sensors import get_current_water_levels
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class SimSnapshot:
+    """Point-in-time copy of the state shown on the dashboard."""
+    levels: Dict[str, float]
+    pumps: Tuple[Tuple[str, str, str, PumpState], ...] # (pump_id, status text, color, state)
+    system_message: Optional[str] = None
+    warnings: Tuple[str, ...] = ()
+
+async def control_loop(cycle: Callable[[], None], running: threading.Event, stop: threading.Event) -> None:
+    """
+    Calls `cycle` every SIMULATION_INTERVAL_SECONDS while `running` is set,
+    until `stop` is set. The blocking cycle (simulation + DB queueing) runs in the
+    default executor so the event loop keeps its timing. Ticks are scheduled on the
+    loop's monotonic clock, so time spent in a cycle doesn't push later ticks back.
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while not stop.is_set():
+        next_tick = max(next_tick + SIMULATION_INTERVAL_SECONDS, loop.time()) # Skip ticks missed while overrunning
+        await asyncio.sleep(next_tick - loop.time())
+        if not running.is_set() or stop.is_set():
+            continue
+        try:
+            await loop.run_in_executor(None, cycle)
+        except Exception:
+            logger.exception("Control cycle failed.")
+
+class SimRunner:
+    """
+    Runs control cycles for one controller on a background thread and keeps
+    the latest SimSnapshot behind a lock, so the UI can read it at its own pace.
+    """
+    def __init__(self, ctrl: AutomationController):
+        self.ctrl = ctrl
+        self.running = threading.Event() # Cycles only run while this is set (pause/resume)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = self._take_snapshot()
+
+    @property
+    def snapshot(self) -> SimSnapshot:
+        """The most recently published state."""
+        with self._snapshot_lock:
+            return self._snapshot
+
+    def _take_snapshot(self) -> SimSnapshot:
+        """Copies the controller state; the caller must not be mid-cycle (hold ctrl.lock or be the loop)."""
+        pumps = tuple((pump_id, *pump.get_status_display(), pump.state) for pump_id, pump in self.ctrl.pump_items)
+        return SimSnapshot(
+            levels=get_current_water_levels(),
+            pumps=pumps,
+            system_message=self.ctrl.system_message,
+            warnings=tuple(self.ctrl.warnings),
+        )
+
+    def publish(self) -> None:
+        """Publishes a fresh snapshot, e.g. after the UI changed the controller directly."""
+        with self.ctrl.lock:
+            snapshot = self._take_snapshot()
+        with self._snapshot_lock:
+            self._snapshot = snapshot
+
+    def _cycle(self) -> None:
+        """Runs one control cycle while holding the controller lock, then publishes its result."""
+        with self.ctrl.lock:
+            self.ctrl.run_control_cycle(datetime.datetime.now())
+            snapshot = self._take_snapshot()
+        with self._snapshot_lock:
+            self._snapshot = snapshot
+
+    def start(self) -> None:
+        """Starts control_loop on its own event loop in a daemon thread."""
+        self._thread = threading.Thread(
+            target=asyncio.run,
+            args=(control_loop(self._cycle, self.running, self._stop),),
+            name="control-loop",
+            daemon=True
+        )
+        self._thread.start()
+        logger.info("Background control loop started.")
+
+    def stop(self, wait: bool = False) -> None:
+        """Signals the loop to exit after its current sleep; with `wait`, blocks until it has."""
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
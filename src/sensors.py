@@ -5,7 +5,18 @@ Manages the state of the water tanks based on simulated flows.
 """
 import random
 import datetime
-from typing import Dict, Optional
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError: # numba is optional; without it the step runs as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 from config import (
     MAIN_LINE_TANK_CAPACITY, UNDERGROUND_TANK_CAPACITY, OVERHEAD_TANK_CAPACITY,
@@ -14,87 +25,90 @@ from config import (
     SIMULATION_INTERVAL_SECONDS
 )
 
-class Tank:
-    """Represents a water tank with simulated level."""
-    def __init__(self, name: str, capacity: float, initial_level_pct: float = 50.0):
-        self.name = name
-        self.capacity = capacity
-        self._current_volume = (initial_level_pct / 100.0) * capacity
-        self.level_pct = initial_level_pct # Keep track of percentage too
-
-    def get_level_percentage(self) -> float:
-        """Returns the current water level as a percentage."""
-        self.level_pct = (self._current_volume / self.capacity) * 100.0
-        return max(0.0, min(100.0, self.level_pct)) # Clamp between 0 and 100
-
-    def add_water(self, volume: float) -> float:
-        """Adds water to the tank, returns overflow volume."""
-        potential_volume = self._current_volume + volume
-        overflow = max(0.0, potential_volume - self.capacity)
-        self._current_volume = min(self.capacity, potential_volume)
-        self.get_level_percentage() # Update percentage
-        return overflow
-
-    def remove_water(self, volume: float) -> float:
-        """Removes water from the tank, returns actual volume removed."""
-        volume_to_remove = min(volume, self._current_volume)
-        self._current_volume -= volume_to_remove
-        self.get_level_percentage() # Update percentage
-        return volume_to_remove
+logger = logging.getLogger(__name__)
 
 # --- Global Tank States (Simulation) ---
-# Initialize tanks - these will be managed by the simulation update function
-tanks: Dict[str, Tank] = {
-    "main_line": Tank("Main Line Tank", MAIN_LINE_TANK_CAPACITY, initial_level_pct=20.0),
-    "underground": Tank("Underground Tank", UNDERGROUND_TANK_CAPACITY, initial_level_pct=30.0),
-    "overhead": Tank("Overhead Tank", OVERHEAD_TANK_CAPACITY, initial_level_pct=50.0),
-}
-
-def update_tank_levels(pump_states: Dict[str, bool], current_time: datetime.datetime) -> None:
+# Volumes and capacities live in arrays (ordered as TANK_NAMES) so a simulation
+# step is a handful of scalar operations on them.
+TANK_NAMES = ("main_line", "underground", "overhead")
+_DEFAULT_LEVELS = {"main_line": 20.0, "underground": 30.0, "overhead": 50.0}
+
+_capacities = np.array([MAIN_LINE_TANK_CAPACITY, UNDERGROUND_TANK_CAPACITY, OVERHEAD_TANK_CAPACITY], dtype=np.float64)
+_volumes = np.zeros(len(TANK_NAMES), dtype=np.float64)
+_levels = np.zeros(len(TANK_NAMES), dtype=np.float64) # Percentages, refreshed after every change to _volumes
+
+# Volumes moved in one simulation step (dt is fixed, so these are computed once):
+# P1, P2 and P3 flow, then city supply inflow and household consumption
+_STEPS = np.array(
+    [P1_FLOW_RATE, P2_FLOW_RATE, P3_FLOW_RATE, CITY_SUPPLY_FLOW_RATE, HOUSEHOLD_CONSUMPTION_RATE],
+    dtype=np.float64
+) * SIMULATION_INTERVAL_SECONDS
+
+# Simulated pressure faults (1 in 1000 checks) are drawn in batches and consumed one per check
+_PRESSURE_FAULT_PROBABILITY = 1 / 1000
+_FAULT_BATCH_SIZE = 1024
+_fault_rng = np.random.default_rng()
+_fault_mask: List[bool] = [] # Kept as a list: indexing it is cheaper than indexing a numpy array
+_fault_idx = 0
+
+def _refresh_levels() -> None:
+    """Recomputes the level percentages from the current volumes."""
+    np.divide(_volumes, _capacities, out=_levels)
+    np.multiply(_levels, 100.0, out=_levels)
+    np.clip(_levels, 0.0, 100.0, out=_levels) # Clamp between 0 and 100
+
+def _set_levels(levels_pct: Dict[str, float]) -> None:
+    """Sets every tank's volume from a dict of level percentages."""
+    _volumes[:] = [levels_pct[name] for name in TANK_NAMES]
+    np.multiply(_volumes, _capacities / 100.0, out=_volumes)
+    _refresh_levels()
+
+# Initialize tank state - managed by the simulation update function
+_set_levels(_DEFAULT_LEVELS)
+
+@njit(cache=True, fastmath=True)
+def _step(vols, caps, pump_mask, hour, rand_u, steps, supply_start_hour, supply_end_hour):
+    """
+    Advances the tank volumes by one simulation step, in place.
+    Pure scalar arithmetic so numba can compile it; rand_u is the pre-sampled city supply variation.
+    Config values are passed in rather than read as globals, which the on-disk cache would freeze.
+    """
+    # 1. City Supply to Main Line Tank
+    if supply_start_hour <= hour < supply_end_hour:
+        vols[0] = min(caps[0], vols[0] + steps[3] * rand_u)
+
+    # 2. Pumps: P1 Main Line -> Underground, P2 Boring Well -> Underground, P3 Underground -> Overhead.
+    # All flows are taken from the volumes at the start of the step; a pump can't draw more
+    # than its source tank holds (the boring well is unlimited).
+    p1 = min(steps[0], vols[0]) if pump_mask & 1 else 0.0
+    p2 = steps[1] if pump_mask & 2 else 0.0
+    p3 = min(steps[2], vols[1]) if pump_mask & 4 else 0.0
+    vols[0] -= p1
+    vols[1] += p1 + p2 - p3
+    vols[2] += p3
+
+    # 3. Household Consumption from Overhead Tank
+    vols[2] -= steps[4]
+
+    # Overflow is lost, and tanks can't go below empty
+    for i in range(vols.shape[0]):
+        vols[i] = min(max(vols[i], 0.0), caps[i])
+
+def update_tank_levels(pump_mask: int, hour: int) -> None:
     """
     Updates the simulated water levels in the tanks based on pump activity,
     city supply, and consumption. Called periodically.
+    pump_mask has bit 0 set when P1 runs, bit 1 for P2 and bit 2 for P3; hour is the current hour of day.
+    All pump flows in a step are applied together, then volumes are clipped to capacity.
     """
-    global tanks
-    dt = SIMULATION_INTERVAL_SECONDS # Time step for simulation
-
-    # 1. City Supply to Main Line Tank
-    hour = current_time.hour
-    if CITY_SUPPLY_START_HOUR <= hour < CITY_SUPPLY_END_HOUR:
-        # Add some randomness to simulate variable flow
-        flow_variation = random.uniform(0.8, 1.2)
-        inflow = CITY_SUPPLY_FLOW_RATE * flow_variation * dt
-        tanks["main_line"].add_water(inflow)
-        # print(f"Debug: City supply adding {inflow:.2f}L") # DEBUG
-
-    # 2. Pump P1: Main Line -> Underground
-    if pump_states.get("P1", False):
-        volume_drawn = tanks["main_line"].remove_water(P1_FLOW_RATE * dt)
-        tanks["underground"].add_water(volume_drawn)
-        # print(f"Debug: P1 moved {volume_drawn:.2f}L") # DEBUG
-
-    # 3. Pump P2: Boring Well -> Underground (Assume infinite well supply for simplicity)
-    if pump_states.get("P2", False):
-        tanks["underground"].add_water(P2_FLOW_RATE * dt)
-        # print(f"Debug: P2 added {P2_FLOW_RATE * dt:.2f}L") # DEBUG
-
-
-    # 4. Pump P3: Underground -> Overhead
-    if pump_states.get("P3", False):
-        volume_drawn = tanks["underground"].remove_water(P3_FLOW_RATE * dt)
-        tanks["overhead"].add_water(volume_drawn)
-        # print(f"Debug: P3 moved {volume_drawn:.2f}L") # DEBUG
-
-    # 5. Household Consumption from Overhead Tank
-    consumption = HOUSEHOLD_CONSUMPTION_RATE * dt
-    tanks["overhead"].remove_water(consumption)
-    # print(f"Debug: Consumption removed {consumption:.2f}L") # DEBUG
-
-    # 6. Optional: Simulate very slow natural decrease (e.g., evaporation) - negligible here
+    # Add some randomness to simulate variable city supply flow
+    flow_variation = random.uniform(0.8, 1.2)
+    _step(_volumes, _capacities, pump_mask, hour, flow_variation, _STEPS, CITY_SUPPLY_START_HOUR, CITY_SUPPLY_END_HOUR)
+    _refresh_levels()
 
 def get_current_water_levels() -> Dict[str, float]:
     """Returns the current simulated water levels for all tanks."""
-    return {name: tank.get_level_percentage() for name, tank in tanks.items()}
+    return dict(zip(TANK_NAMES, _levels.tolist()))
 
 def check_pump_pressure(pump_id: str) -> bool:
     """
@@ -102,33 +116,30 @@ def check_pump_pressure(pump_id: str) -> bool:
     Returns True if pressure is OK, False if pressure is zero (simulated fault).
     Introduces a small chance of a zero pressure fault for testing.
     """
+    global _fault_mask, _fault_idx
+    if _fault_idx >= len(_fault_mask):
+        _fault_mask = (_fault_rng.random(_FAULT_BATCH_SIZE) < _PRESSURE_FAULT_PROBABILITY).tolist()
+        _fault_idx = 0
     # Simulate a rare pressure fault (e.g., 1 in 1000 checks)
-    if random.randint(1, 1000) == 1:
-        print(f"Debug: Simulated zero pressure for {pump_id}") # DEBUG
+    fault = _fault_mask[_fault_idx]
+    _fault_idx += 1
+    if fault:
+        logger.debug("Simulated zero pressure for %s", pump_id)
         return False
     return True
 
 def reset_simulation(initial_levels: Optional[Dict[str, float]] = None) -> None:
     """Resets tank levels to initial or specified percentages."""
-    global tanks
-    default_levels = {
-        "main_line": 20.0,
-        "underground": 30.0,
-        "overhead": 50.0,
-    }
-    levels_to_set = initial_levels if initial_levels else default_levels
-    tanks["main_line"] = Tank("Main Line Tank", MAIN_LINE_TANK_CAPACITY, levels_to_set["main_line"])
-    tanks["underground"] = Tank("Underground Tank", UNDERGROUND_TANK_CAPACITY, levels_to_set["underground"])
-    tanks["overhead"] = Tank("Overhead Tank", OVERHEAD_TANK_CAPACITY, levels_to_set["overhead"])
+    levels_to_set = initial_levels if initial_levels else _DEFAULT_LEVELS
+    _set_levels(levels_to_set)
     print("Simulation tanks reset.")
 
 
 # Example usage (for testing module directly)
 if __name__ == "__main__":
     print("Initial Levels:", get_current_water_levels())
-    pump_states_test = {"P1": True, "P2": False, "P3": False}
     now = datetime.datetime.now()
-    update_tank_levels(pump_states_test, now)
+    update_tank_levels(0b001, now.hour) # P1 only
     print("Levels after 1 step (P1 ON):", get_current_water_levels())
     print("Pressure Check P1:", check_pump_pressure("P1"))
     reset_simulation()